@@ -1,37 +1,66 @@
 # Rewriting the full Streamlit app with dollar-based minimum premium logic for covered calls
 
 full_app_code_dollar_premium = """
+import itertools
+import os
+import diskcache
+import threading
+import time
 import streamlit as st
 import pandas as pd
+import numpy as np
 import yfinance as yf
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from xml.etree import ElementTree
 
 st.set_page_config(page_title="Stock Scanner", layout="wide")
 st.title("📈 Options Strategy Scanner (Breakouts, Covered Calls, Put Credit Spreads)")
 
+# yfinance keeps its own on-disk cache (ticker timezones used by every download);
+# point it at a mounted volume so it survives container restarts. Relocating it
+# closes yfinance's open cache databases, so it must happen once per process
+@st.cache_resource
+def configure_yfinance_cache():
+    if os.environ.get("YF_CACHE_DIR"):
+        yf.set_cache_location(os.environ["YF_CACHE_DIR"])
+
+configure_yfinance_cache()
+
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.3)
+    session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retries))
+    return session
+
+# Market data that should survive restarts lives here, each entry with its own expiry
+@st.cache_resource
+def get_disk_cache():
+    return diskcache.Cache(os.environ.get("SCANNER_CACHE_DIR", ".scanner_cache"))
+
 @st.cache_data(ttl=302400)
 def fetch_us_econ_calendar():
     url = "https://nfs.faireconomy.media/ff_calendar_thisweek.xml"
     try:
-        res = requests.get(url)
-        tree = ElementTree.fromstring(res.content)
-        events = []
-        for e in tree.findall("event"):
-            if e.find("country").text != "USD":
-                continue
-            impact = e.find("impact").text
-            color = {"High": "🔴", "Medium": "🟡", "Low": "🟢"}.get(impact, "⚪")
-            events.append({
-                "Date": e.find("date").text,
-                "Time": e.find("time").text,
-                "Event": e.find("title").text,
-                "Impact": impact,
-                "Color": color
-            })
+        fields = {"Date": "date", "Time": "time", "Event": "title", "Impact": "impact"}
+        events = {col: [] for col in fields}
+        with get_session().get(url, timeout=5, stream=True) as res:
+            res.raw.decode_content = True
+            for _, e in ElementTree.iterparse(res.raw):
+                if e.tag != "event":
+                    continue
+                if e.findtext("country") == "USD":
+                    for col, tag in fields.items():
+                        events[col].append(e.findtext(tag))
+                e.clear()
         df = pd.DataFrame(events)
-        df["Label"] = df["Color"] + " " + df["Event"] + " (" + df["Impact"] + ")"
+        color = df["Impact"].map({"High": "🔴", "Medium": "🟡", "Low": "🟢"}).fillna("⚪")
+        df["Label"] = color.str.cat([df["Event"], "(" + df["Impact"] + ")"], sep=" ")
         return df[["Date", "Time", "Label"]]
     except:
         return pd.DataFrame()
@@ -39,71 +68,224 @@ def fetch_us_econ_calendar():
 @st.cache_data
 def load_optionable_tickers():
     try:
-        return pd.read_csv("default_stock_list.csv")["Ticker"].tolist()
+        return pd.read_csv("default_stock_list.csv", usecols=["Ticker"], dtype={"Ticker": str}, engine="c")["Ticker"].tolist()
     except:
         return ["AAPL", "MSFT", "TSLA", "SPY", "QQQ", "IWM", "DIA", "AMD", "NVDA", "GOOGL", "META", "NFLX"]
 
+def fetch_prices(tickers, period):
+    key = ("prices", tickers, period)
+    prices = get_disk_cache().get(key)
+    if prices is not None:
+        return prices
+    data = yf.download(list(tickers), period=period, auto_adjust=True, threads=True, progress=False)
+    if data.empty:
+        empty = pd.DataFrame(columns=list(tickers), dtype=float)
+        return empty, empty
+    prices = data["Close"].reindex(columns=list(tickers)), data["Volume"].reindex(columns=list(tickers))
+    get_disk_cache().set(key, prices, expire=900)
+    return prices
+
+YAHOO_MAX_RPS = 10
+
+# Shared by every worker thread and rerun: start times of the last YAHOO_MAX_RPS calls
+@st.cache_resource
+def get_rate_limiter():
+    return threading.Lock(), deque(maxlen=YAHOO_MAX_RPS)
+
+def yahoo_call(fn, attempts=3):
+    lock, started = get_rate_limiter()
+    for attempt in range(attempts):
+        with lock:
+            if len(started) == started.maxlen:
+                time.sleep(max(0, 1 - (time.monotonic() - started[0])))
+            started.append(time.monotonic())
+        try:
+            return fn()
+        except Exception as e:
+            # Only a 429 is worth retrying, and only after backing off
+            if attempt == attempts - 1 or "too many requests" not in str(e).lower():
+                raise
+            time.sleep(2 ** attempt)
+
+# .info is the slowest yfinance call and only needed for IV, so it's opt-in
+def fetch_implied_volatility(ticker):
+    key = ("iv", ticker)
+    iv = get_disk_cache().get(key)
+    if iv is None:
+        info = yahoo_call(lambda: yf.Ticker(ticker).info) or {}
+        iv = round((info.get("impliedVolatility") or 0) * 100, 2)
+        get_disk_cache().set(key, iv, expire=86400)
+    return iv
+
+# option_chain() re-downloads the expiration list on a fresh Ticker, so each
+# symbol keeps the one Ticker that already loaded .options
+@st.cache_resource(ttl=600, show_spinner=False)
+def get_option_ticker(ticker):
+    stock = yf.Ticker(ticker)
+    return stock, yahoo_call(lambda: stock.options)
+
+def fetch_expirations(ticker):
+    return get_option_ticker(ticker)[1]
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_option_chain(ticker, exp):
+    # Keep only the columns the scan reads, as plain arrays
+    stock = get_option_ticker(ticker)[0]
+    chain = yahoo_call(lambda: stock.option_chain(exp))
+    calls, puts = chain.calls, chain.puts
+    put_strikes = puts["strike"].to_numpy()
+    order = np.argsort(put_strikes, kind="stable")
+    return (
+        (calls["strike"].to_numpy(), calls["bid"].to_numpy()),
+        (put_strikes[order], puts["bid"].to_numpy()[order], puts["ask"].to_numpy()[order])
+    )
+
+# Long-lived pool for option chain requests, shared by every ticker's scan
+@st.cache_resource
+def get_chain_executor():
+    return ThreadPoolExecutor(max_workers=32)
+
 def get_rsi(data, window=14):
+    # Wilder's smoothing is an EMA with alpha = 1 / window
     delta = data.diff()
-    gain = delta.where(delta > 0, 0).rolling(window=window).mean()
-    loss = -delta.where(delta < 0, 0).rolling(window=window).mean()
+    gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    loss = -delta.clip(upper=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
     rs = gain / loss
     return 100 - (100 / (1 + rs))
 
-def scan_stock(ticker, breakout_days, call_dte_limit, call_min_dollar, min_pop=0.65):
+COVERED_CALL_PRICE_RANGE = (3, 35)
+CALL_COLUMNS = ["Ticker", "Strike", "Premium", "Yield %", "DTE", "Exp", "Price", "Entry", "Exit"]
+SPREAD_COLUMNS = ["Ticker", "Short", "Long", "Credit", "Width", "POP", "Exp", "DTE", "Price"]
+BREAKOUT_COLUMNS = ["Ticker", "Price", "RSI", "IV", "Avg Vol", "Breakout", "Covered Calls", "Put Spreads"]
+
+def scan_stock(ticker, price, extended, call_dte_limit, call_min_dollar, min_pop=0.65):
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="60d")
-        if hist.empty:
-            return None
-        price = hist["Close"].iloc[-1]
-        rsi = get_rsi(hist["Close"]).iloc[-1]
-        info = stock.info
-        iv = round(info.get("impliedVolatility", 0) * 100, 2)
-        avg_vol = info.get("averageVolume", 0)
-
-        breakout = price >= hist["Close"].tail(breakout_days).max() * 0.98
-        covered_calls, spreads = [], []
-
-        if stock.options:
-            for exp in stock.options:
-                dte = (datetime.strptime(exp, "%Y-%m-%d") - datetime.today()).days
-                if dte > call_dte_limit:
-                    continue
-                chain = stock.option_chain(exp)
-
-                for call in chain.calls.itertuples():
-                    if 3 <= price <= 35 and call.strike > price:
-                        if call.bid >= call_min_dollar:
-                            covered_calls.append({
-                                "Ticker": ticker, "Strike": call.strike, "Premium": call.bid,
-                                "Yield %": round((call.bid / price) * 100, 2), "DTE": dte,
-                                "Exp": exp, "Price": price, "Entry": datetime.today().date(),
-                                "Exit": datetime.today().date() + timedelta(days=dte)
-                            })
-
-                puts = chain.puts.sort_values("strike")
-                for i in range(len(puts) - 1):
-                    short, long = puts.iloc[i], puts.iloc[i+1]
-                    width = long.strike - short.strike
-                    credit = short.bid - long.ask
-                    if credit > 0 and width > 0 and (credit / width) >= 0.33:
-                        pop = 0.75 if short.strike < price else 0.5
-                        if pop >= min_pop:
-                            spreads.append({
-                                "Ticker": ticker, "Short": short.strike, "Long": long.strike,
-                                "Credit": round(credit, 2), "Width": width, "POP": pop,
-                                "Exp": exp, "DTE": dte, "Price": price
-                            })
-                            break
-        return {
-            "Ticker": ticker, "Price": price, "RSI": round(rsi, 2), "IV": iv,
-            "Avg Vol": avg_vol, "Breakout": breakout,
-            "Covered Calls": covered_calls, "Put Spreads": spreads
-        }
+        today = datetime.today().date()
+        iv = fetch_implied_volatility(ticker) if extended else np.nan
+
+        covered_call_eligible = COVERED_CALL_PRICE_RANGE[0] <= price <= COVERED_CALL_PRICE_RANGE[1]
+        # Candidates are accumulated column-wise, one list per output column
+        covered_calls = {col: [] for col in CALL_COLUMNS}
+        spreads = {col: [] for col in SPREAD_COLUMNS}
+
+        exps = fetch_expirations(ticker)
+        dtes = (np.array(exps, dtype="datetime64[D]") - np.datetime64(today, "D")).astype(int)
+        expirations = [(exp, int(dte)) for exp, dte in zip(exps, dtes) if dte <= call_dte_limit]
+        chains = get_chain_executor().map(lambda e: fetch_option_chain(ticker, e[0]), expirations)
+
+        for (exp, dte), ((strikes, bids), (put_strikes, put_bids, put_asks)) in zip(expirations, chains):
+            if covered_call_eligible:
+                hits = np.flatnonzero((strikes > price) & (bids >= call_min_dollar))
+                k, premiums = len(hits), bids[hits]
+                values = (
+                    [ticker] * k, strikes[hits].tolist(), premiums.tolist(),
+                    np.round(premiums / price * 100, 2).tolist(), [dte] * k, [exp] * k,
+                    [price] * k, [today] * k, [today + timedelta(days=dte)] * k
+                )
+                for col, column_values in zip(CALL_COLUMNS, values):
+                    covered_calls[col] += column_values
+
+            # Pair each put with the next strike up and take the first qualifying spread
+            width = np.diff(put_strikes)
+            credit = put_bids[:-1] - put_asks[1:]
+            pop = np.where(put_strikes[:-1] < price, 0.75, 0.5)
+            ok = (credit > 0) & (width > 0) & (credit >= 0.33 * width) & (pop >= min_pop)
+            if ok.any():
+                i = ok.argmax()
+                values = (
+                    ticker, put_strikes[i], put_strikes[i + 1], round(credit[i], 2),
+                    width[i], pop[i], exp, dte, price
+                )
+                for col, value in zip(SPREAD_COLUMNS, values):
+                    spreads[col].append(value)
+        return iv, covered_calls, spreads
     except:
         return None
 
+def merge_columns(parts, columns):
+    return pd.DataFrame({col: list(itertools.chain.from_iterable(part[col] for part in parts)) for col in columns})
+
+def to_records(part):
+    return [dict(zip(part, row)) for row in zip(*part.values())]
+
+def downcast(df):
+    for col in df.select_dtypes("float").columns:
+        df[col] = pd.to_numeric(df[col], downcast="float")
+    for col in df.select_dtypes("integer").columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def to_csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+def show_table(df, show_all, rows=50):
+    st.dataframe(df if show_all else df.head(rows))
+    if not show_all and len(df) > rows:
+        st.caption(f"Showing {rows} of {len(df)} rows")
+
+def screen_tickers(tickers, breakout_days):
+    # Prices come down in one batched request, and the indicators are
+    # column-wise reductions over every ticker at once
+    n = len(tickers)
+    cols = {
+        "Price": np.full(n, np.nan),
+        "RSI": np.full(n, np.nan, dtype=np.float32),
+        "Avg Vol": np.full(n, np.nan, dtype=np.float32),
+        "Breakout": np.zeros(n, dtype=bool)
+    }
+    closes, volumes = fetch_prices(tuple(tickers), "3mo")
+    if len(closes):
+        # 3mo is only for Avg Vol; RSI and breakouts keep the original 60-day history
+        recent = closes.loc[closes.index > closes.index[-1] - pd.Timedelta(days=60)]
+        cols["Price"][:] = closes.ffill().iloc[-1].to_numpy()
+        cols["RSI"][:] = get_rsi(recent).iloc[-1].round(2).to_numpy()
+        cols["Avg Vol"][:] = volumes.mean().to_numpy()
+        cols["Breakout"][:] = cols["Price"] >= recent.tail(breakout_days).max().to_numpy() * 0.98
+
+    df = pd.DataFrame({"Ticker": tickers, **cols}).dropna(subset=["Price"]).reset_index(drop=True)
+    if len(df) < n:
+        st.caption(f"No price history for {n - len(df)} of {n} tickers")
+    return df
+
+def scan_options(df, *args, extended=False, workers=8):
+    # Option chains (and IV) are per-ticker network work, so fan them out over a thread pool
+    n = len(df)
+    cols = {
+        "IV": np.full(n, np.nan, dtype=np.float32),
+        "Covered Calls": [[] for _ in range(n)],
+        "Put Spreads": [[] for _ in range(n)]
+    }
+    scanned = np.zeros(n, dtype=bool)
+    progress = st.progress(0.0)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {
+            ex.submit(scan_stock, t, price, extended, *args): i
+            for i, (t, price) in enumerate(zip(df["Ticker"], df["Price"]))
+        }
+        for done, fut in enumerate(as_completed(futures), 1):
+            r = fut.result()
+            if r is not None:
+                i = futures[fut]
+                scanned[i] = True
+                for name, value in zip(cols, r):
+                    cols[name][i] = value
+            if done % 10 == 0 or done == n:
+                progress.progress(done / n, text=f"Scanned {done} of {n} tickers")
+    progress.empty()
+
+    df = df.assign(**cols).loc[scanned]
+    if len(df) < n:
+        st.caption(f"No option data for {n - len(df)} of {n} tickers")
+    return df
+
+extended_fields = st.sidebar.checkbox("Fetch IV from Yahoo quote summary (slower)", value=False)
+max_workers = st.sidebar.slider("Parallel ticker requests", 1, 32, 8)
+if st.sidebar.button("🔄 Force refresh market data"):
+    for cached in (get_option_ticker, fetch_option_chain):
+        cached.clear()
+    get_disk_cache().clear()
+
 tab1, tab2, tab3, tab4 = st.tabs(["📊 Breakouts", "📤 Covered Calls", "📥 Put Credit Spreads", "📅 Calendar"])
 
 with tab1:
@@ -111,53 +293,60 @@ with tab1:
     breakout_days = st.selectbox("Breakout window", [30, 60])
     rsi_range = st.slider("RSI Range", 0, 100, (30, 70))
     min_vol = st.number_input("Min Avg Volume", value=100000)
+    breakout_all = st.checkbox("Show all rows", key="breakout_all")
     scan_btn = st.button("🔍 Run Breakout Scan")
     if scan_btn:
-        tickers = load_optionable_tickers()
-        rows = []
-        for t in tickers:
-            res = scan_stock(t, breakout_days, 14, 25)
-            if res and res["Breakout"] and rsi_range[0] <= res["RSI"] <= rsi_range[1] and res["Avg Vol"] >= min_vol:
-                rows.append(res)
-        st.dataframe(pd.DataFrame(rows))
+        # Screen on the cheap batched indicators first; only survivors get option chains
+        df = screen_tickers(load_optionable_tickers(), breakout_days)
+        mask = (
+            df["Breakout"].to_numpy()
+            & df["RSI"].between(*rsi_range).to_numpy()
+            & (df["Avg Vol"].to_numpy() >= min_vol)
+        )
+        df = scan_options(df.loc[mask], 14, 25, extended=extended_fields, workers=max_workers)
+        # Candidate cells are shown as one record per contract or spread
+        df = df.assign(**{col: df[col].map(to_records) for col in ("Covered Calls", "Put Spreads")})
+        st.session_state["breakout_results"] = df[BREAKOUT_COLUMNS]
+    # Results are kept across reruns, so toggling "Show all rows" only re-renders the table
+    if "breakout_results" in st.session_state:
+        show_table(st.session_state["breakout_results"], breakout_all)
 
 with tab2:
     st.subheader("📤 Covered Call Finder")
     call_dte = st.slider("Max DTE", 7, 30, 14)
     call_prem_dollar = st.slider("Minimum Covered Call Premium ($)", 25.0, 500.0, 25.0, step=5.0)
+    calls_all = st.checkbox("Show all rows", key="calls_all")
     run_calls = st.button("🔍 Scan Covered Calls")
     if run_calls:
-        tickers = load_optionable_tickers()
-        calls = []
-        for t in tickers:
-            r = scan_stock(t, 30, call_dte, call_prem_dollar)
-            if r and r["Covered Calls"]:
-                calls += r["Covered Calls"]
-        df = pd.DataFrame(calls)
-        st.dataframe(df)
-        st.download_button("Download Calls", df.to_csv(index=False), "covered_calls.csv")
+        df = screen_tickers(load_optionable_tickers(), 30)
+        df = df.loc[df["Price"].between(*COVERED_CALL_PRICE_RANGE)]
+        calls = scan_options(df, call_dte, call_prem_dollar, workers=max_workers)["Covered Calls"]
+        st.session_state["calls_results"] = downcast(merge_columns(calls, CALL_COLUMNS))
+    if "calls_results" in st.session_state:
+        df = st.session_state["calls_results"]
+        show_table(df, calls_all)
+        st.download_button("Download Calls", to_csv_bytes(df), "covered_calls.csv")
 
 with tab3:
     st.subheader("📥 Put Credit Spread Screener")
     min_pop = st.slider("Min POP (%)", 50, 90, 65)
+    spreads_all = st.checkbox("Show all rows", key="spreads_all")
     run_spreads = st.button("🔍 Scan Put Spreads")
     if run_spreads:
-        tickers = load_optionable_tickers()
-        spreads = []
-        for t in tickers:
-            r = scan_stock(t, 30, 14, 25, min_pop / 100)
-            if r and r["Put Spreads"]:
-                spreads += r["Put Spreads"]
-        df = pd.DataFrame(spreads)
-        st.dataframe(df)
-        st.download_button("Download Spreads", df.to_csv(index=False), "put_spreads.csv")
+        df = screen_tickers(load_optionable_tickers(), 30)
+        spreads = scan_options(df, 14, 25, min_pop / 100, workers=max_workers)["Put Spreads"]
+        st.session_state["spreads_results"] = downcast(merge_columns(spreads, SPREAD_COLUMNS))
+    if "spreads_results" in st.session_state:
+        df = st.session_state["spreads_results"]
+        show_table(df, spreads_all)
+        st.download_button("Download Spreads", to_csv_bytes(df), "put_spreads.csv")
 
 with tab4:
     st.subheader("📅 Weekly US Economic Calendar")
     econ = fetch_us_econ_calendar()
     if not econ.empty:
         st.dataframe(econ)
-        st.download_button("Download Calendar", econ.to_csv(index=False), "econ_calendar.csv")
+        st.download_button("Download Calendar", to_csv_bytes(econ), "econ_calendar.csv")
     else:
         st.error("Could not fetch calendar.")
 """